@@ -1,77 +1,289 @@
 import os
+import sys
 import subprocess
 import logging as log
 
-from .students import Student, create_user, enroll_student, get_student_group
-from .projects import create_tag, setup_projects
-from gitlab.exceptions import GitlabCreateError, GitlabGetError
+from .students import Student, MissingStudentsGroup, create_user, enroll_student, get_student_group
+from .course import InvalidCourse
+from .projects import create_tag, plan_projects, reference_forks
+from .store import open_store, refresh_reference
+from .parallel import WorkItem, run_in_stages, selected
+from .export import ArchiveWriter, export_submissions
+from .teardown import RosterMismatch, unenroll_plan, archive_plan, print_plan, execute_plan
+from gitlab.exceptions import GitlabCreateError, GitlabError
+
+
+def course_name(row):
+    """Returns the course (or reference project) of a row of the manifest"""
+
+    return row[0]
+
+
+def enroll_course(gl, store, course_name, students, ldap_base, ldap_provider):
+    """Creates Gitlab users from exported students list and enrolls them in the
+    course
+
+    Returns a `WorkItem` for each student that is not enrolled yet.
+
+    Args:
+        gl: API
+        store: `CourseStore` caching the course layout
+        course_name: name of the course
+        students: path of the CSV file exported from Stud.IP
+        ldap_base: the search base string for the LDAP query
+        ldap_provider: LDAP provider configured for Gitlab
+    """
+
+    student_group = get_student_group(gl, course_name, store)
+
+    def enroll(student):
+        try:
+            user = create_user(gl, student, ldap_base, ldap_provider)
+            # TODO this is ugly, should be group of course, but python-gitlab does not cache the query
+            enroll_student(gl, user, student_group)
+            store.add_user(course_name, user.id, user.username, student.group)
+        except GitlabCreateError:
+            log.warn('Failed to create user: %s' % student.user)
+
+    with open(students, encoding='iso8859') as students_csv:
+        return [WorkItem('%s/%s' % (course_name, student.user),
+                         lambda student=student: enroll(student))
+                for student in Student.from_csv(students_csv)
+                if store.user(course_name, student.user) is None]
 
 
 def enroll_students(gl, args):
-    """Creates Gitlab users from exported students list
+    """Creates Gitlab users from exported students lists for all selected
+    courses
 
     Args:
         gl: API
         args: command line arguments
     """
 
-    student_group = get_student_group(gl, args.course)
+    courses = selected(args, args.course)
+    store = open_store(args, [row[0] for row in courses])
 
-    with open(args.students, encoding='iso8859') as students_csv:
-        for student in Student.from_csv(students_csv):
-            try:
-                user = create_user(gl, student, args.ldap_base, args.ldap_provider)
-                # TODO this is ugly, should be group of course, but python-gitlab does not cache the query
-                enroll_student(gl, user, student_group)
-            except GitlabCreateError:
-                log.warn('Failed to create user: %s' % student.user)
+    def enroll(row):
+        students = row[1] if len(row) > 1 else args.students
+        return enroll_course(gl, store, row[0], students, args.ldap_base, args.ldap_provider)
 
+    if run_in_stages(enroll, courses, args.jobs, name=course_name):
+        sys.exit(1)
 
-def projects(gl, args):
-    """Creates the projects for all course participants
+
+def setup_course(gl, store, course_name, deploy_key):
+    """Creates the groups of the course and returns a `WorkItem` for each
+    participant without a project
 
     Args:
         gl: API
-        args: command line arguments
+        store: `CourseStore` caching the course layout
+        course_name: name of the course
+        deploy_key: public deploy key used to access the created projects
     """
+
+    stored = store.course(course_name)
+
     course = None
-    for g in gl.groups.list(search=args.course):
-        if g.name == args.course:
-            course = g
-    if course is None:
-        log.warn('The course does not exist')
+    if stored is not None:
+        course = gl.groups.get(stored.group_id)
     else:
-        with open(args.deploy_key, 'r') as key:
-            key = key.read()
-            setup_projects(gl, course, key)
+        for g in gl.groups.list(search=course_name):
+            if g.name == course_name:
+                course = g
+    if course is None:
+        raise InvalidCourse('The course %s does not exist' % course_name)
 
+    store.set_course(course.name, course.id)
+    return plan_projects(gl, course, deploy_key, store)
 
-def deadline(gl, args):
-    """Checks deadlines for course and triggers deadline if it is reached
+
+def projects(gl, args):
+    """Creates the projects for all participants of the selected courses
 
     Args:
         gl: API
         args: command line arguments
     """
 
-    deadline_name = args.tag_name
+    courses = selected(args, args.course)
+    store = open_store(args, [row[0] for row in courses])
+
+    with open(args.deploy_key, 'r') as key:
+        key = key.read()
+
+    if run_in_stages(lambda row: setup_course(gl, store, row[0], key),
+                     courses, args.jobs, name=course_name):
+        sys.exit(1)
+
+
+def tag_deadline(gl, args, store, reference_path, deadline_name):
+    """Creates the deadline tag in the reference project and returns a
+    `WorkItem` for each of its forks creating the tag there
+
+    Args:
+        gl: API
+        args: command line arguments
+        store: `CourseStore` caching the forks of the reference project
+        reference_path: path of the project with the reference solutions
+        deadline_name: name of the tag to be created
+    """
+
+    reference = gl.projects.get(reference_path, lazy=False)
+    refresh_reference(args, store, reference.id)
+
     try:
-        reference = gl.projects.get(args.reference, lazy=False)
+        create_tag(reference, deadline_name, 'master')
+    except GitlabCreateError as e:
+        print(e.error_message)
 
+    def tag(fork):
+        project = gl.projects.get(fork.id, lazy=True)
         try:
-            create_tag(reference, deadline_name, 'master')
+            create_tag(project, deadline_name, 'master')
         except GitlabCreateError as e:
             print(e.error_message)
 
-        for fork in reference.forks.list():
-            project = gl.projects.get(fork.id, lazy=False)
+    return [WorkItem(fork.path, lambda fork=fork: tag(fork))
+            for fork in reference_forks(reference, store)]
+
+
+def deadline(gl, args):
+    """Checks deadlines for the selected courses and triggers deadline if it is
+    reached
+
+    Args:
+        gl: API
+        args: command line arguments
+    """
+
+    references = selected(args, args.reference)
+    store = open_store(args)
+
+    if run_in_stages(lambda row: tag_deadline(gl, args, store, row[0], args.tag_name),
+                     references, args.jobs, name=course_name):
+        sys.exit(1)
+
+
+def export(gl, args):
+    """Exports the state of all solutions at a tag into tar files without
+    cloning the repositories
+
+    Args:
+        gl: API
+        args: command line arguments
+    """
+
+    tag = args.tag_name
+    output = args.output or (tag if args.per_group else '%s.tar' % tag)
+    store = open_store(args)
+    writer = ArchiveWriter(output, args.per_group, args.dry_run)
+
+    failed = False
+    try:
+        for row in selected(args, args.reference):
+            # a missing reference or course only fails its own export
             try:
-                create_tag(project, deadline_name, 'master')
-            except GitlabCreateError as e:
-                print(e.error_message)
+                reference = gl.projects.get(row[0], lazy=False)
+                refresh_reference(args, store, reference.id)
+                if export_submissions(gl, store, reference, tag, writer, args.jobs):
+                    failed = True
+            except GitlabError as e:
+                print('Failed for %s: %s' % (row[0], e.error_message), file=sys.stderr)
+                failed = True
+    finally:
+        writer.close()
 
-    except GitlabGetError as e:
-        print(e.error_message)
+    if failed:
+        sys.exit(1)
+
+
+def confirm(question):
+    """Asks the user a yes/no question on the terminal, defaults to no
+
+    Args:
+        question: question to ask
+    """
+
+    try:
+        return input('%s [y/N] ' % question).strip().lower() in ('y', 'yes')
+    except EOFError:
+        return False
+
+
+def teardown(plan, args):
+    """Prints the planned operations for all selected courses and executes them
+    after confirmation
+
+    Nothing is executed if the plan could not be created for one of the
+    courses.
+
+    Args:
+        plan: function returning the planned tasks for a row of the manifest
+        args: command line arguments
+    """
+
+    tasks = []
+    failed = False
+    for row in selected(args, args.course):
+        try:
+            tasks.extend(plan(row))
+        except (InvalidCourse, MissingStudentsGroup):
+            print('The course %s does not exist' % row[0], file=sys.stderr)
+            failed = True
+        except RosterMismatch:
+            print('Refusing to remove every student of %s, use --force to do so' % row[0],
+                  file=sys.stderr)
+            failed = True
+
+    print_plan(tasks)
+    if failed:
+        sys.exit(1)
+    if len(tasks) == 0:
+        return
+
+    if not (args.yes or args.dry_run or confirm('Execute the planned operations?')):
+        print('Aborted', file=sys.stderr)
+        sys.exit(1)
+
+    if execute_plan(tasks, args.jobs):
+        sys.exit(1)
+
+
+def unenroll(gl, args):
+    """Removes the students that are no longer listed in the exported students
+    list from the selected courses
+
+    Args:
+        gl: API
+        args: command line arguments
+    """
+
+    courses = [row[0] for row in selected(args, args.course)]
+    store = open_store(args, courses)
+
+    def plan(row):
+        students = row[1] if len(row) > 1 else args.students
+        with open(students, encoding='iso8859') as students_csv:
+            roster = set(student.user for student in Student.from_csv(students_csv))
+        return unenroll_plan(gl, store, row[0], roster, args.delete, args.force)
+
+    teardown(plan, args)
+
+
+def archive_course(gl, args):
+    """Archives all projects of the selected courses
+
+    Args:
+        gl: API
+        args: command line arguments
+    """
+
+    courses = [row[0] for row in selected(args, args.course)]
+    store = open_store(args, courses)
+
+    teardown(lambda row: archive_plan(gl, store, row[0], args.delete), args)
 
 
 def plagiates(gl, args):
@@ -82,27 +294,32 @@ def plagiates(gl, args):
         args: command line arguments
     """
 
+    def run(command):
+        if args.dry_run:
+            print(' '.join(command))
+        else:
+            subprocess.run(command)
+
     solutions_dir = 'input'
     tag = args.tag_name
     reference = gl.projects.get(args.reference, lazy=False)
-    if not os.path.exists(solutions_dir):
-        os.mkdir(solutions_dir)
-    os.chdir(solutions_dir)
+    if not args.dry_run:
+        if not os.path.exists(solutions_dir):
+            os.mkdir(solutions_dir)
+        os.chdir(solutions_dir)
     try:
-        subprocess.run(
-            ['git', 'clone', '--branch', tag, reference.ssh_url_to_repo, reference.path_with_namespace])
+        run(['git', 'clone', '--branch', tag, reference.ssh_url_to_repo, reference.path_with_namespace])
     except subprocess.CalledProcessError as e:
         print(e.error_message)
     for fork in reference.forks.list():
         project = gl.projects.get(fork.id, lazy=False)
         try:
-            subprocess.run(
-                ['git', 'clone', '--branch', tag, project.ssh_url_to_repo, project.path_with_namespace])
+            run(['git', 'clone', '--branch', tag, project.ssh_url_to_repo, project.path_with_namespace])
         except subprocess.CalledProcessError as e:
             print(e.error_message)
-    os.chdir('..')
-    subprocess.run(
-        ['java', '-jar', args.jplag_jar, '-s', solutions_dir, '-p', 'java', '-r', 'results', '-bc', args.reference, '-l', 'java17'])
+    if not args.dry_run:
+        os.chdir('..')
+    run(['java', '-jar', args.jplag_jar, '-s', solutions_dir, '-p', 'java', '-r', 'results', '-bc', args.reference, '-l', 'java17'])
 
 
 def course(gl, args):
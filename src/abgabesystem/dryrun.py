@@ -0,0 +1,221 @@
+import re
+import time
+import itertools
+import threading
+
+from collections import Counter
+
+from .parallel import current_chain
+
+# assumed duration of a request if no request was actually sent
+DEFAULT_LATENCY = 0.25
+
+# requests on objects that were only simulated carry one of these ids
+FAKE_ID = re.compile(r'/(-\d+)(?=/|\?|$)')
+
+# ids (or URL-encoded paths) anywhere in the path
+ID = re.compile(r'/(-?\d+|[^/?]*%2F[^/?]*)(?=/|\?|$)')
+
+# the segment following one of these collections identifies a single object
+# whatever its form, e.g. the path of a group or the name of a tag
+NAMED = re.compile(r'/(groups|projects|users|tags|branches)/[^/?]+')
+
+
+class FakeAttributes(dict):
+    """Attributes of a simulated object. Attributes that are not known are
+    replaced by a placeholder, so that the command can continue.
+    """
+
+    def __missing__(self, key):
+        if key.startswith('_'):
+            raise KeyError(key)
+        return '<dry-run>'
+
+
+class FakeResponse():
+    """Response to a request that was not sent to the server
+
+    Args:
+        data: JSON content of the response
+    """
+
+    status_code = 200
+    links = {}
+
+    def __init__(self, data):
+        self.data = data
+        self.headers = {'Content-Type': 'application/json'}
+        self.content = b''
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, chunk_size=1):
+        return iter([])
+
+
+class DryRun():
+    """Records the requests that a command would send
+
+    Requests that modify data, download archives or refer to objects that
+    were only simulated are not sent. All other requests are sent as usual,
+    because their results determine the following requests.
+
+    The requests are also counted by work item of `run_parallel`, because
+    only the work items run concurrently. Requests outside of `run_parallel`
+    are sent one after another.
+
+    Args:
+        limit: `RateLimit` the requests are throttled with, the time spent
+               waiting for it is not counted as latency
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.simulated = Counter()
+        self.chains = Counter()
+        self.serial = 0
+        self.sent = 0
+        self.duration = 0.0
+        self.fake_ids = itertools.count(-1, -1)
+
+    def endpoint(self, verb, path):
+        """Returns the endpoint of the request with all ids replaced by `:id`
+
+        Args:
+            verb: HTTP method
+            path: path or URL of the request
+        """
+
+        path = path.split('/api/v4', 1)[-1].split('?', 1)[0]
+        path = NAMED.sub(r'/\1/:id', ID.sub('/:id', path))
+        return '%s %s' % (verb.upper(), path)
+
+    def respond(self, verb, path, post_data):
+        """Returns a simulated response to a request
+
+        Args:
+            verb: HTTP method
+            path: path or URL of the request
+            post_data: data sent with the request
+        """
+
+        if verb == 'get':
+            last = path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+            if not re.match(r'^-\d+$', last):
+                # listing the members of a simulated object
+                return FakeResponse([])
+            return FakeResponse(FakeAttributes(id=int(last)))
+
+        attrs = FakeAttributes(post_data or {})
+        if verb == 'post':
+            with self.lock:
+                attrs['id'] = next(self.fake_ids)
+
+        return FakeResponse(attrs)
+
+    def wrap(self, gl):
+        """Records all requests sent using the API object
+
+        Args:
+            gl: Gitlab API object
+        """
+
+        http_request = gl.http_request
+
+        def recorded_request(verb, path, *args, **kwargs):
+            verb = verb.lower()
+            endpoint = self.endpoint(verb, path)
+            simulate = (verb != 'get' or kwargs.get('streamed', False)
+                        or FAKE_ID.search(path) is not None)
+
+            chain = current_chain()
+            with self.lock:
+                self.calls[endpoint] += 1
+                if chain is None:
+                    self.serial += 1
+                else:
+                    self.chains[chain] += 1
+                if simulate:
+                    self.simulated[endpoint] += 1
+
+            if simulate:
+                return self.respond(verb, path, kwargs.get('post_data'))
+
+            start = time.monotonic()
+            try:
+                return http_request(verb, path, *args, **kwargs)
+            finally:
+                duration = time.monotonic() - start
+                if self.limit is not None:
+                    duration -= self.limit.waited()
+                with self.lock:
+                    self.sent += 1
+                    self.duration += duration
+
+        gl.http_request = recorded_request
+
+    def latency(self):
+        """Returns the average duration of the requests that were sent"""
+
+        if self.sent == 0:
+            return DEFAULT_LATENCY
+
+        return self.duration / self.sent
+
+    def estimate(self, jobs, rate):
+        """Returns the estimated wall time of the command in seconds
+
+        The work items of `run_parallel` are spread over `jobs` threads, so
+        they take at least as long as the longest work item. The other
+        requests are sent one after another.
+
+        Args:
+            jobs: number of concurrent work items
+            rate: maximum number of requests per second, `0` for no limit
+        """
+
+        chained = sum(self.chains.values())
+        longest = max(self.chains.values(), default=0)
+        wall_time = (self.serial + max(longest, chained / max(jobs, 1))) * self.latency()
+        if rate:
+            wall_time = max(wall_time, sum(self.calls.values()) / rate)
+
+        return wall_time
+
+    def report(self, jobs, rate):
+        """Prints the number of requests by endpoint and the estimated wall
+        time of the command
+
+        Args:
+            jobs: number of concurrent requests
+            rate: maximum number of requests per second, `0` for no limit
+        """
+
+        for endpoint, count in sorted(self.calls.items()):
+            print('%6d %s' % (count, endpoint))
+
+        total = sum(self.calls.values())
+        print('%6d requests, %d of them not sent' % (total, sum(self.simulated.values())))
+        print('Estimated time: %.0f s with %d jobs at %s requests/s (%.3f s per request)' % (
+            self.estimate(jobs, rate), jobs, rate or 'unlimited', self.latency()))
+
+
+def record_requests(gl, limit=None):
+    """Simulates all requests modifying data sent using the API object and
+    returns the `DryRun` recording them
+
+    Must be called after `limit_requests`, so that simulated requests are not
+    throttled.
+
+    Args:
+        gl: Gitlab API object
+        limit: `RateLimit` returned by `limit_requests`
+    """
+
+    dry_run = DryRun(limit)
+    dry_run.wrap(gl)
+
+    return dry_run
@@ -0,0 +1,195 @@
+import os
+import tarfile
+import tempfile
+import threading
+import logging as log
+
+from .parallel import run_parallel
+from .projects import reference_forks
+from .students import MissingStudentsGroup, enrolled_students
+
+# archives larger than this are spooled to disk instead of being kept in memory
+SPOOL_SIZE = 8 * 1024 * 1024
+
+UNGROUPED = 'ungrouped'
+
+
+class ArchiveWriter():
+    """Writes the downloaded archives to one or more tar files
+
+    The archives of the repositories are already compressed, so they are
+    stored as they are inside uncompressed tar files. The archives are written
+    to a new file next to the tar file of a previous export. When the writer
+    is closed, the members of the previous tar file that were not exported
+    again are copied over and the new file replaces the old one. This way a
+    re-exported archive replaces its previous version.
+
+    Args:
+        output: path of the tar file, or of the directory containing one tar
+                file per tutorial group if `per_group` is set
+        per_group: write one tar file per tutorial group
+        dry_run: discard the archives instead of writing them
+    """
+
+    def __init__(self, output, per_group=False, dry_run=False):
+        self.output = output
+        self.per_group = per_group
+        self.dry_run = dry_run
+        self.lock = threading.Lock()
+        self.archives = {}
+        self.names = {}
+        self.committed = []
+
+        if per_group and not dry_run:
+            os.makedirs(output, exist_ok=True)
+
+    def path(self, group):
+        """Returns the path of the tar file the archives of the tutorial group
+        are written to
+
+        Args:
+            group: tutorial group
+        """
+
+        if self.per_group:
+            return os.path.join(self.output, '%s.tar' % group)
+
+        return self.output
+
+    def member(self, tag, course, group, username):
+        """Returns the name of the archive of the student inside the tar file
+
+        Args:
+            tag: name of the exported tag
+            course: name of the course
+            group: tutorial group of the student
+            username: name of the student
+        """
+
+        if self.per_group:
+            return '%s/%s/%s.tar.gz' % (tag, course, username)
+
+        return '%s/%s/%s/%s.tar.gz' % (tag, course, group, username)
+
+    def add(self, group, name, fileobj, size, committed=None):
+        """Adds an archive to the tar file of the tutorial group
+
+        Args:
+            group: tutorial group
+            name: name of the archive inside the tar file
+            fileobj: file to read the archive from
+            size: size of the archive
+            committed: called once the tar file has been written completely
+        """
+
+        if self.dry_run:
+            return
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        with self.lock:
+            path = self.path(group)
+            if path not in self.archives:
+                self.archives[path] = tarfile.open(path + '.partial', 'w')
+                self.names[path] = set()
+            self.archives[path].addfile(info, fileobj)
+            self.names[path].add(name)
+            if committed is not None:
+                self.committed.append(committed)
+
+    def close(self):
+        """Completes the tar files and replaces those of the previous export"""
+
+        with self.lock:
+            for path, archive in self.archives.items():
+                if os.path.exists(path):
+                    with tarfile.open(path, 'r') as previous:
+                        for member in previous:
+                            if member.name not in self.names[path]:
+                                archive.addfile(member, previous.extractfile(member))
+                archive.close()
+                os.replace(path + '.partial', path)
+
+            committed = self.committed
+            self.archives = {}
+            self.names = {}
+            self.committed = []
+
+        for callback in committed:
+            callback()
+
+
+def export_fork(gl, store, writer, fork, tag, course, group):
+    """Streams the archive of the fork at the tag into the writer
+
+    The export is skipped if the tag still points to the same commit as
+    during the last export into the same tar file. The commit is recorded in
+    the store once the writer has been closed.
+
+    Args:
+        gl: Gitlab API object
+        store: `CourseStore` recording the exported commits
+        writer: `ArchiveWriter` to add the archive to
+        fork: stored fork of the reference project
+        tag: name of the tag to export
+        course: name of the course
+        group: tutorial group of the student the fork belongs to
+    """
+
+    project = gl.projects.get(fork.id, lazy=True)
+    sha = project.tags.get(tag).commit['id']
+    path = writer.path(group)
+
+    if os.path.exists(path) and store.exported(fork.id, tag, path) == sha:
+        log.info('Skipping %s, %s is unchanged' % (fork.path, tag))
+        return
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        project.repository_archive(sha=sha, streamed=True, action=spool.write)
+        size = spool.tell()
+        spool.seek(0)
+        writer.add(group, writer.member(tag, course, group, fork.username), spool, size,
+                   lambda: store.set_exported(fork.id, tag, path, sha))
+
+    log.info('Exported %s at %s' % (fork.path, tag))
+
+
+def export_submissions(gl, store, reference, tag, writer, jobs):
+    """Exports the state of all forks of the reference project at the tag
+
+    Args:
+        gl: Gitlab API object
+        store: `CourseStore` caching the forks and tutorial groups
+        reference: project with the reference solutions
+        tag: name of the tag to export
+        writer: `ArchiveWriter` to add the archives to
+        jobs: maximum number of concurrent downloads
+
+    Returns the forks that could not be exported.
+    """
+
+    stored = store.course_by_reference(reference.id)
+    if stored is not None:
+        course = gl.groups.get(stored.group_id)
+    else:
+        course = gl.groups.get(reference.namespace['full_path'].split('/')[0])
+        store.set_course(course.name, course.id, reference_id=reference.id)
+
+    # fills the store with the tutorial groups unless all students are stored
+    try:
+        for _ in enrolled_students(gl, course, store):
+            pass
+    except MissingStudentsGroup:
+        log.warning('The course %s has no students group' % course.name)
+
+    groups = dict((user.username, user.group) for user in store.users(course.name))
+
+    def export(fork):
+        group = groups.get(fork.username)
+        if group is None:
+            log.warning('The tutorial group of %s is unknown' % fork.username)
+            group = UNGROUPED
+        export_fork(gl, store, writer, fork, tag, course.name, group)
+
+    return run_parallel(export, reference_forks(reference, store), jobs,
+                        name=lambda fork: fork.path)
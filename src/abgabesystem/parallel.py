@@ -0,0 +1,183 @@
+import csv
+import sys
+import time
+import itertools
+import threading
+import logging as log
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# the work item of `run_parallel` each thread is working on
+current = threading.local()
+chains = itertools.count()
+
+
+# a unit of work found while processing a course, e.g. the project of a student
+WorkItem = namedtuple('WorkItem', ['name', 'run'])
+
+
+def current_chain():
+    """Returns the id of the work item of `run_parallel` the current thread is
+    working on, or `None` outside of `run_parallel`. The requests of one work
+    item are sent one after another.
+    """
+
+    return getattr(current, 'chain', None)
+
+
+class RateLimit():
+    """Limits the rate of API requests shared by all threads
+
+    Args:
+        rate: maximum number of requests per second, `0` for no limit
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next = time.monotonic()
+        self.local = threading.local()
+
+    def wait(self):
+        """Blocks until the next request may be sent"""
+
+        self.local.waited = 0.0
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+            self.local.waited = delay
+
+    def waited(self):
+        """Returns how long the last call of `wait` in the current thread
+        blocked
+        """
+
+        return getattr(self.local, 'waited', 0.0)
+
+
+def limit_requests(gl, rate):
+    """Throttles all requests sent using the API object
+
+    Args:
+        gl: Gitlab API object
+        rate: maximum number of requests per second, `0` for no limit
+    """
+
+    limit = RateLimit(rate)
+    http_request = gl.http_request
+
+    def limited_request(*args, **kwargs):
+        limit.wait()
+        return http_request(*args, **kwargs)
+
+    gl.http_request = limited_request
+
+    return limit
+
+
+def run_parallel(func, items, jobs, name=str):
+    """Calls `func` for each of the items using at most `jobs` threads.
+
+    Exceptions raised by `func` are reported on stderr and do not stop the
+    other items. Returns the items for which `func` failed.
+
+    Args:
+        func: function to call for each item
+        items: arguments to call `func` with
+        jobs: maximum number of concurrent calls
+        name: function returning the name of an item used in error messages
+    """
+
+    def run(chain, item):
+        previous = current_chain()
+        current.chain = chain
+        try:
+            return func(item)
+        finally:
+            current.chain = previous
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [(item, executor.submit(run, next(chains), item)) for item in items]
+        for item, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                log.error('Failed for %s: %s' % (name(item), e))
+                print('Failed for %s: %s' % (name(item), e), file=sys.stderr)
+                failed.append(item)
+
+    return failed
+
+
+def run_in_stages(plan, rows, jobs, name=str):
+    """Calls `plan` for each of the rows concurrently, then runs the work
+    items returned by all calls in the same pool of threads.
+
+    This way the work inside of the courses, e.g. one item per student, is
+    spread over all threads instead of being done by the thread of its
+    course. Returns the rows and work items that failed.
+
+    Args:
+        plan: function returning the `WorkItem`s for a row
+        rows: arguments to call `plan` with
+        jobs: maximum number of concurrent calls
+        name: function returning the name of a row used in error messages
+    """
+
+    items = []
+    lock = threading.Lock()
+
+    def collect(row):
+        planned = plan(row)
+        with lock:
+            items.extend(planned)
+
+    failed = run_parallel(collect, rows, jobs, name=name)
+
+    return failed + run_parallel(lambda item: item.run(), items, jobs,
+                                 name=lambda item: item.name)
+
+
+def read_manifest(manifest):
+    """Reads a course manifest
+
+    Each line contains the name of a course (or the path of a reference
+    project) and optionally further columns separated by `;`, e.g. the
+    students CSV file for the course. Empty lines and lines starting with `#`
+    are ignored.
+
+    Args:
+        manifest: open manifest file
+    """
+
+    for row in csv.reader(manifest, delimiter=';', quotechar='"'):
+        if len(row) == 0 or row[0].strip() == '' or row[0].startswith('#'):
+            continue
+        yield [column.strip() for column in row]
+
+
+def selected(args, names):
+    """Returns the rows of the courses selected on the command line and in the
+    manifest file.
+
+    Args:
+        args: command line arguments
+        names: courses or reference projects given on the command line
+    """
+
+    rows = [[name] for name in names or []]
+    if args.manifest is not None:
+        with open(args.manifest, 'r') as manifest:
+            rows.extend(read_manifest(manifest))
+
+    return rows
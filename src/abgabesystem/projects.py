@@ -4,6 +4,7 @@ from gitlab import DEVELOPER_ACCESS
 from gitlab.exceptions import GitlabError, GitlabCreateError
 from .students import enrolled_students
 from .course import InvalidCourse, create_solutions_group
+from .parallel import WorkItem
 
 
 def create_tag(project, tag, ref):
@@ -18,7 +19,7 @@ def create_tag(project, tag, ref):
         ref: name of the red (branch / commit) to create the new tag on
     """
 
-    print('Project %s. Creating tag %s' % (project.path, tag))
+    print('Project %s. Creating tag %s' % (getattr(project, 'path', project.get_id()), tag))
 
     project.tags.create({
         'tag_name': tag,
@@ -67,6 +68,8 @@ def create_project(gl, group, user, reference, deploy_key):
         reference: project to fork the new project from
         deploy_key: deploy key used by the `abgabesystem` to access the new
                     project
+
+    Returns the forked project or `None` if it could not be created.
     """
 
     subgroup = None
@@ -94,10 +97,30 @@ def create_project(gl, group, user, reference, deploy_key):
         log.warning('Failed to add student %s to its own group' % user.username)
 
     try:
-        fork_reference(gl, reference, subgroup, deploy_key)
+        return fork_reference(gl, reference, subgroup, deploy_key)
     except GitlabCreateError as e:
         log.warning(e.error_message)
 
+    return None
+
+
+def reference_forks(reference, store):
+    """Returns the forks of the reference project
+
+    The forks are always listed using the API, because students may have been
+    added since the last run. The listed forks replace those in the store.
+
+    Args:
+        reference: project with the reference solutions
+        store: `CourseStore` caching the forks
+    """
+
+    store.set_forks(reference.id, [
+        (fork.id, fork.namespace['path'], fork.path_with_namespace)
+        for fork in reference.forks.list(all=True)])
+
+    return store.forks(reference.id)
+
 
 def create_reference_solution(gl, namespace):
     """Creates a new project for the reference solutions.
@@ -128,32 +151,74 @@ def create_reference_solution(gl, namespace):
     return reference_project
 
 
-def setup_projects(gl, course, deploy_key):
+def plan_projects(gl, course, deploy_key, store=None):
     """Sets up the internal structure for the group for use with the course.
 
+    Returns a `WorkItem` for each enrolled student without a project that
+    creates the project. The work items may run concurrently.
+
     Args:
         gl: gitlab API object
         course: course to set up projects for
         deploy_key: will be used to access the solutions from the abgabesystem
+        store: optional `CourseStore` caching the group and project ids
     """
 
+    stored = store.course(course.name) if store is not None else None
+
     solutions = None
-    solutions_groups = course.subgroups.list(search='solutions')
-    for group in solutions_groups:
-        if group.name == 'solutions':
-            solutions = gl.groups.get(group.id)
+    if stored is not None and stored.solutions_id is not None:
+        solutions = gl.groups.get(stored.solutions_id, lazy=True)
+    else:
+        solutions_groups = course.subgroups.list(search='solutions')
+        for group in solutions_groups:
+            if group.name == 'solutions':
+                solutions = gl.groups.get(group.id)
 
     if solutions is None:
         solutions = create_solutions_group(gl, course)
 
     reference_project = None
-    reference_projects = solutions.projects.list(search='solutions')
-    for project in reference_projects:
-        if project.name == 'solutions':
-            reference_project = gl.projects.get(project.id)
+    if stored is not None and stored.reference_id is not None:
+        reference_project = gl.projects.get(stored.reference_id, lazy=True)
+    else:
+        reference_projects = solutions.projects.list(search='solutions')
+        for project in reference_projects:
+            if project.name == 'solutions':
+                reference_project = gl.projects.get(project.id)
 
     if reference_project is None:
         reference_project = create_reference_solution(gl, solutions.id)
 
-    for user in enrolled_students(gl, course):
-        create_project(gl, solutions, user, reference_project, deploy_key)
+    if store is not None:
+        store.set_course(course.name, course.id,
+                         solutions_id=solutions.id,
+                         reference_id=reference_project.id)
+        forked = set(fork.username for fork in store.forks(reference_project.id))
+    else:
+        forked = set()
+
+    def create(user):
+        project = create_project(gl, solutions, user, reference_project, deploy_key)
+        if store is not None and project is not None:
+            store.add_fork(project.id, reference_project.id, user.username,
+                           project.path_with_namespace)
+
+    return [WorkItem('%s/%s' % (course.name, user.username), lambda user=user: create(user))
+            for user in enrolled_students(gl, course, store)
+            if user.username not in forked]
+
+
+def setup_projects(gl, course, deploy_key, store=None):
+    """Sets up the internal structure for the group for use with the course
+    and creates the missing projects one after another.
+
+    Args:
+        gl: gitlab API object
+        course: course to set up projects for
+        deploy_key: will be used to access the solutions from the abgabesystem
+        store: optional `CourseStore` caching the group and project ids
+    """
+
+    for item in plan_projects(gl, course, deploy_key, store):
+        item.run()
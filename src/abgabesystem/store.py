@@ -0,0 +1,440 @@
+import os
+import functools
+import sqlite3
+import threading
+from collections import namedtuple
+
+
+StoredCourse = namedtuple(
+    'StoredCourse',
+    ['name', 'group_id', 'students_id', 'solutions_id', 'reference_id'])
+
+StoredUser = namedtuple('StoredUser', ['id', 'username', 'course', 'group'])
+
+StoredFork = namedtuple('StoredFork', ['id', 'reference_id', 'username', 'path'])
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    name TEXT PRIMARY KEY,
+    group_id INTEGER NOT NULL,
+    students_id INTEGER,
+    solutions_id INTEGER,
+    reference_id INTEGER,
+    -- set once all members of the students group have been stored
+    students_listed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS courses_reference ON courses (reference_id);
+
+CREATE TABLE IF NOT EXISTS users (
+    course TEXT NOT NULL,
+    username TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    tutorial_group TEXT,
+    PRIMARY KEY (course, username)
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_group ON users (course, tutorial_group);
+
+CREATE TABLE IF NOT EXISTS forks (
+    id INTEGER PRIMARY KEY,
+    reference_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS forks_reference ON forks (reference_id);
+CREATE INDEX IF NOT EXISTS forks_username ON forks (username);
+
+CREATE TABLE IF NOT EXISTS exports (
+    fork_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    archive TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    PRIMARY KEY (fork_id, tag, archive)
+);
+"""
+
+
+def synchronized(method):
+    """Serializes calls to the method using the lock of the store"""
+
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return locked
+
+
+class CourseStore():
+    """Local SQLite cache of the course layout in Gitlab
+
+    Stores the ids of the course group, its `students` and `solutions`
+    subgroups, the reference project, the enrolled users with their tutorial
+    group and the forks of the reference project, so that the subcommands do
+    not have to rediscover them using the API on every run.
+
+    The store is only a cache. Anything that is missing from it is looked up
+    using the API and written back. Use `forget` to drop stale entries.
+
+    Args:
+        path: path of the database file, `:memory:` for a temporary store
+    """
+
+    def __init__(self, path=':memory:'):
+        # the store is shared by the threads working on different courses
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    @synchronized
+    def load(self, path):
+        """Replaces the contents of the store by those of another database
+        file
+
+        Args:
+            path: path of the database file
+        """
+
+        source = sqlite3.connect(path)
+        try:
+            source.backup(self.db)
+        finally:
+            source.close()
+
+    @synchronized
+    def close(self):
+        self.db.close()
+
+    @synchronized
+    def course(self, name):
+        """Returns the stored course or `None`
+
+        Args:
+            name: name of the course
+        """
+
+        row = self.db.execute(
+            'SELECT name, group_id, students_id, solutions_id, reference_id '
+            'FROM courses WHERE name = ?', (name,)).fetchone()
+
+        return StoredCourse(*row) if row else None
+
+    @synchronized
+    def course_by_reference(self, reference_id):
+        """Returns the stored course that uses the reference project or `None`
+
+        Args:
+            reference_id: id of the reference project
+        """
+
+        row = self.db.execute(
+            'SELECT name, group_id, students_id, solutions_id, reference_id '
+            'FROM courses WHERE reference_id = ?', (reference_id,)).fetchone()
+
+        return StoredCourse(*row) if row else None
+
+    @synchronized
+    def set_course(self, name, group_id, students_id=None, solutions_id=None,
+                   reference_id=None):
+        """Stores the ids of a course. Ids that are `None` keep their
+        previously stored value.
+
+        Args:
+            name: name of the course
+            group_id: id of the group of the course
+            students_id: id of the `students` subgroup
+            solutions_id: id of the `solutions` subgroup
+            reference_id: id of the project with the reference solutions
+        """
+
+        with self.db:
+            self.db.execute(
+                'INSERT INTO courses '
+                '(name, group_id, students_id, solutions_id, reference_id) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET '
+                'group_id = excluded.group_id, '
+                'students_id = COALESCE(excluded.students_id, students_id), '
+                'solutions_id = COALESCE(excluded.solutions_id, solutions_id), '
+                'reference_id = COALESCE(excluded.reference_id, reference_id)',
+                (name, group_id, students_id, solutions_id, reference_id))
+
+    @synchronized
+    def students_listed(self, course):
+        """Returns whether all students of the course have been stored
+
+        Args:
+            course: name of the course
+        """
+
+        row = self.db.execute(
+            'SELECT students_listed FROM courses WHERE name = ?',
+            (course,)).fetchone()
+
+        return row is not None and bool(row[0])
+
+    @synchronized
+    def set_students_listed(self, course):
+        """Marks the stored students of the course as complete. The course
+        must have been stored using `set_course` before.
+
+        Args:
+            course: name of the course
+        """
+
+        with self.db:
+            self.db.execute(
+                'UPDATE courses SET students_listed = 1 WHERE name = ?',
+                (course,))
+
+    @synchronized
+    def user(self, course, username):
+        """Returns the stored user of the course or `None`
+
+        Args:
+            course: name of the course
+            username: name of the user
+        """
+
+        row = self.db.execute(
+            'SELECT id, username, course, tutorial_group FROM users '
+            'WHERE course = ? AND username = ?', (course, username)).fetchone()
+
+        return StoredUser(*row) if row else None
+
+    @synchronized
+    def users(self, course, group=None):
+        """Returns the stored users of the course
+
+        Args:
+            course: name of the course
+            group: only return users of this tutorial group
+        """
+
+        if group is None:
+            rows = self.db.execute(
+                'SELECT id, username, course, tutorial_group FROM users '
+                'WHERE course = ? ORDER BY username', (course,))
+        else:
+            rows = self.db.execute(
+                'SELECT id, username, course, tutorial_group FROM users '
+                'WHERE course = ? AND tutorial_group = ? ORDER BY username',
+                (course, group))
+
+        return [StoredUser(*row) for row in rows]
+
+    @synchronized
+    def add_user(self, course, user_id, username, group=None):
+        """Stores a user enrolled in the course
+
+        Args:
+            course: name of the course
+            user_id: Gitlab id of the user
+            username: name of the user
+            group: tutorial group of the user
+        """
+
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO users '
+                '(course, username, id, tutorial_group) VALUES (?, ?, ?, ?)',
+                (course, username, user_id, group))
+
+    @synchronized
+    def remove_user(self, course, username):
+        """Removes a user that is no longer enrolled in the course
+
+        Args:
+            course: name of the course
+            username: name of the user
+        """
+
+        with self.db:
+            self.db.execute(
+                'DELETE FROM users WHERE course = ? AND username = ?',
+                (course, username))
+
+    @synchronized
+    def set_users(self, course, users):
+        """Replaces the stored users of the course
+
+        Args:
+            course: name of the course
+            users: tuples of the id, the name and the tutorial group of each
+                   user
+        """
+
+        with self.db:
+            self.db.execute('DELETE FROM users WHERE course = ?', (course,))
+            self.db.executemany(
+                'INSERT OR REPLACE INTO users '
+                '(course, username, id, tutorial_group) VALUES (?, ?, ?, ?)',
+                [(course, username, user_id, group)
+                 for user_id, username, group in users])
+
+    @synchronized
+    def fork(self, fork_id):
+        """Returns the stored fork or `None`
+
+        Args:
+            fork_id: id of the forked project
+        """
+
+        row = self.db.execute(
+            'SELECT id, reference_id, username, path FROM forks WHERE id = ?',
+            (fork_id,)).fetchone()
+
+        return StoredFork(*row) if row else None
+
+    @synchronized
+    def forks(self, reference_id):
+        """Returns the stored forks of the reference project
+
+        Args:
+            reference_id: id of the reference project
+        """
+
+        rows = self.db.execute(
+            'SELECT id, reference_id, username, path FROM forks '
+            'WHERE reference_id = ? ORDER BY username', (reference_id,))
+
+        return [StoredFork(*row) for row in rows]
+
+    @synchronized
+    def add_fork(self, fork_id, reference_id, username, path=None):
+        """Stores a fork of the reference project
+
+        Args:
+            fork_id: id of the forked project
+            reference_id: id of the reference project
+            username: name of the student the fork belongs to
+            path: path with namespace of the forked project
+        """
+
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO forks (id, reference_id, username, path) '
+                'VALUES (?, ?, ?, ?)', (fork_id, reference_id, username, path))
+
+    @synchronized
+    def remove_fork(self, fork_id):
+        """Removes a fork that was archived or deleted
+
+        Args:
+            fork_id: id of the forked project
+        """
+
+        with self.db:
+            self.db.execute('DELETE FROM forks WHERE id = ?', (fork_id,))
+
+    @synchronized
+    def exported(self, fork_id, tag, archive):
+        """Returns the SHA of the tag at the last export of the fork into the
+        archive or `None`
+
+        Args:
+            fork_id: id of the forked project
+            tag: name of the exported tag
+            archive: path of the archive
+        """
+
+        row = self.db.execute(
+            'SELECT sha FROM exports WHERE fork_id = ? AND tag = ? AND archive = ?',
+            (fork_id, tag, archive)).fetchone()
+
+        return row[0] if row else None
+
+    @synchronized
+    def set_exported(self, fork_id, tag, archive, sha):
+        """Stores the SHA of the tag exported from the fork into the archive
+
+        Args:
+            fork_id: id of the forked project
+            tag: name of the exported tag
+            archive: path of the archive
+            sha: SHA of the commit the tag points to
+        """
+
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO exports (fork_id, tag, archive, sha) '
+                'VALUES (?, ?, ?, ?)', (fork_id, tag, archive, sha))
+
+    @synchronized
+    def set_forks(self, reference_id, forks):
+        """Replaces the stored forks of a reference project
+
+        Args:
+            reference_id: id of the reference project
+            forks: tuples of the id, the name of the student and the path of
+                   each fork
+        """
+
+        with self.db:
+            self.db.execute(
+                'DELETE FROM forks WHERE reference_id = ?', (reference_id,))
+            self.db.executemany(
+                'INSERT OR REPLACE INTO forks (id, reference_id, username, path) '
+                'VALUES (?, ?, ?, ?)',
+                [(fork_id, reference_id, username, path)
+                 for fork_id, username, path in forks])
+
+    @synchronized
+    def forget(self, course):
+        """Removes everything stored about the course, so that it will be
+        rediscovered using the API.
+
+        Args:
+            course: name of the course
+        """
+
+        stored = self.course(course)
+        with self.db:
+            if stored is not None and stored.reference_id is not None:
+                self.db.execute(
+                    'DELETE FROM forks WHERE reference_id = ?',
+                    (stored.reference_id,))
+            self.db.execute('DELETE FROM users WHERE course = ?', (course,))
+            self.db.execute('DELETE FROM courses WHERE name = ?', (course,))
+
+
+def open_store(args, courses=()):
+    """Opens the store selected on the command line
+
+    Drops the cached state of the courses if `--refresh` was given. On a dry
+    run, a temporary copy of the store is returned so that it is not modified.
+
+    Args:
+        args: command line arguments
+        courses: names of the courses selected on the command line
+    """
+
+    if args.dry_run:
+        store = CourseStore()
+        if os.path.exists(args.store):
+            store.load(args.store)
+    else:
+        store = CourseStore(args.store)
+    if args.refresh:
+        for course in courses:
+            store.forget(course)
+
+    return store
+
+
+def refresh_reference(args, store, reference_id):
+    """Drops the cached state of the course using the reference project if
+    `--refresh` was given, for commands that select reference projects
+    instead of courses.
+
+    Args:
+        args: command line arguments
+        store: store returned by `open_store`
+        reference_id: id of the reference project
+    """
+
+    if args.refresh:
+        stored = store.course_by_reference(reference_id)
+        if stored is not None:
+            store.forget(stored.name)
@@ -2,6 +2,8 @@ import csv
 import secrets
 
 from gitlab import GUEST_ACCESS
+from gitlab.exceptions import GitlabGetError
+from .course import create_students_group
 
 
 class MissingStudentsGroup(Exception):
@@ -67,14 +69,38 @@ def get_students_csv(gl, students_csv):
             yield users[0]
 
 
-def enrolled_students(gl, course):
+def user_group(user):
+    """Returns the tutorial group of the user stored in the `group` custom
+    attribute or `None` if it is not set.
+
+    Args:
+        user: Gitlab user
+    """
+
+    try:
+        return user.customattributes.get('group').value
+    except GitlabGetError:
+        return None
+
+
+def enrolled_students(gl, course, store=None):
     """Returns the students enrolled in the course
 
+    If a store is given and it contains all students of the course, these
+    are returned without querying the API. Otherwise the students are fetched
+    and replace the stored students once all of them have been returned, so
+    that students who left the course are dropped from the store.
+
     Args:
         gl: Gitlab API object
         course: course the students are enrolled in
+        store: optional `CourseStore` caching the students
     """
 
+    if store is not None and store.students_listed(course.name):
+        yield from store.users(course.name)
+        return
+
     students = None
     for group in course.subgroups.list(search='students'):
         if group.name == 'students':
@@ -85,8 +111,18 @@ def enrolled_students(gl, course):
 
     # get all members excluding inherited members
     students = gl.groups.get(students.id)
-    for member in students.members.list():
-        yield gl.users.get(member.id)
+    if store is not None:
+        store.set_course(course.name, course.id, students_id=students.id)
+
+    listed = []
+    for member in students.members.list(all=True):
+        user = gl.users.get(member.id)
+        listed.append((user.id, user.username, user_group(user)))
+        yield user
+
+    if store is not None:
+        store.set_users(course.name, listed)
+        store.set_students_listed(course.name)
 
 
 def create_user(gl, student, ldap_base, ldap_provider):
@@ -114,14 +150,20 @@ def create_user(gl, student, ldap_base, ldap_provider):
     return user
 
 
-def get_student_group(gl, course_name):
+def get_student_group(gl, course_name, store=None):
     """Gets the `students` subgroup for the course
 
     Args:
         gl: Gitlab API objects
         course_name: name of the course
+        store: optional `CourseStore` caching the group ids
     """
 
+    if store is not None:
+        stored = store.course(course_name)
+        if stored is not None and stored.students_id is not None:
+            return gl.groups.get(stored.students_id, lazy=True)
+
     course = None
     for g in gl.groups.list(search=course_name):
         if g.name == course_name:
@@ -139,6 +181,9 @@ def get_student_group(gl, course_name):
     if students_group is None:
         students_group = create_students_group(gl, course)
 
+    if store is not None:
+        store.set_course(course_name, course.id, students_id=students_group.id)
+
     return students_group
 
 
@@ -0,0 +1,252 @@
+import threading
+import logging as log
+
+from collections import namedtuple
+
+from .course import InvalidCourse
+from .parallel import run_parallel
+from .projects import reference_forks
+from .students import MissingStudentsGroup, enrolled_students
+
+
+class RosterMismatch(Exception):
+    """Raised if unenrolling would remove every student of the course, e.g.
+    because the students list is empty or belongs to another course.
+    """
+
+    pass
+
+
+# a single API operation of a plan
+Action = namedtuple('Action', ['description', 'run'])
+
+# actions that are executed in order, followed by `done` if all succeeded
+Task = namedtuple('Task', ['name', 'actions', 'done'])
+
+
+CourseLayout = namedtuple('CourseLayout', ['course', 'students', 'solutions', 'reference'])
+
+
+def find_subgroup(gl, group, name):
+    """Returns the subgroup of the group with the given name or `None`
+
+    Args:
+        gl: gitlab API object
+        group: parent group
+        name: name of the subgroup
+    """
+
+    for g in group.subgroups.list(search=name):
+        if g.name == name:
+            return gl.groups.get(g.id, lazy=True)
+
+    return None
+
+
+def course_layout(gl, course_name, store):
+    """Looks up the groups and the reference project of the course
+
+    Args:
+        gl: gitlab API object
+        course_name: name of the course
+        store: `CourseStore` caching the course layout
+    """
+
+    stored = store.course(course_name)
+
+    course = None
+    if stored is not None:
+        course = gl.groups.get(stored.group_id)
+    else:
+        for g in gl.groups.list(search=course_name):
+            if g.name == course_name:
+                course = g
+
+    if course is None:
+        raise InvalidCourse()
+
+    if stored is not None and stored.students_id is not None:
+        students = gl.groups.get(stored.students_id, lazy=True)
+    else:
+        students = find_subgroup(gl, course, 'students')
+
+    if students is None:
+        raise MissingStudentsGroup()
+
+    if stored is not None and stored.solutions_id is not None:
+        solutions = gl.groups.get(stored.solutions_id, lazy=True)
+    else:
+        solutions = find_subgroup(gl, course, 'solutions')
+
+    reference = None
+    if stored is not None and stored.reference_id is not None:
+        reference = gl.projects.get(stored.reference_id, lazy=True)
+    elif solutions is not None:
+        for project in solutions.projects.list(search='solutions'):
+            if project.name == 'solutions':
+                reference = gl.projects.get(project.id, lazy=True)
+
+    store.set_course(
+        course_name, course.id, students_id=students.id,
+        solutions_id=solutions.id if solutions is not None else None,
+        reference_id=reference.id if reference is not None else None)
+
+    return CourseLayout(course, students, solutions, reference)
+
+
+def solution_groups(solutions):
+    """Returns the ids of the per-student subgroups of the solutions group by
+    name of the student
+
+    Args:
+        solutions: `solutions` group of the course
+    """
+
+    if solutions is None:
+        return {}
+
+    return dict((g.name, g.id) for g in solutions.subgroups.list(all=True))
+
+
+def unenroll_plan(gl, store, course_name, roster, delete=False, force=False):
+    """Plans the removal of all students enrolled in the course that are not
+    in the roster
+
+    The fork of each student is archived and the student loses access to the
+    course. If `delete` is set, the subgroup of the student in `solutions` is
+    deleted together with the fork instead. Raises `RosterMismatch` if every
+    enrolled student would be removed, unless `force` is set.
+
+    Args:
+        gl: gitlab API object
+        store: `CourseStore` caching the course layout
+        course_name: name of the course
+        roster: names of the students that stay enrolled
+        delete: delete the projects instead of archiving them
+        force: allow removing every student of the course
+    """
+
+    layout = course_layout(gl, course_name, store)
+    subgroups = solution_groups(layout.solutions)
+    forks = {}
+    if layout.reference is not None:
+        forks = dict((f.username, f) for f in reference_forks(layout.reference, store))
+
+    enrolled = list(enrolled_students(gl, layout.course, store))
+    removed = [user for user in enrolled if user.username not in roster]
+    if len(enrolled) > 0 and len(removed) == len(enrolled) and not force:
+        raise RosterMismatch()
+
+    tasks = []
+    for user in removed:
+        actions = []
+        fork = forks.get(user.username)
+        subgroup_id = subgroups.get(user.username)
+
+        if delete and subgroup_id is not None:
+            actions.append(Action(
+                'Delete group solutions/%s' % user.username,
+                lambda subgroup_id=subgroup_id: gl.groups.delete(subgroup_id)))
+        else:
+            if fork is not None:
+                actions.append(Action(
+                    'Archive project %s' % fork.path,
+                    lambda fork=fork: gl.projects.get(fork.id, lazy=True).archive()))
+            if subgroup_id is not None:
+                actions.append(Action(
+                    'Remove %s from group solutions/%s' % (user.username, user.username),
+                    lambda subgroup_id=subgroup_id, user=user:
+                        gl.groups.get(subgroup_id, lazy=True).members.delete(user.id)))
+
+        actions.append(Action(
+            'Remove %s from group students' % user.username,
+            lambda user=user: layout.students.members.delete(user.id)))
+
+        def done(user=user, fork=fork):
+            store.remove_user(course_name, user.username)
+            if fork is not None:
+                store.remove_fork(fork.id)
+
+        tasks.append(Task(user.username, actions, done))
+
+    return tasks
+
+
+def archive_plan(gl, store, course_name, delete=False):
+    """Plans archiving all projects of the course
+
+    If `delete` is set, the group of the course is deleted including all of
+    its subgroups and projects instead.
+
+    Args:
+        gl: gitlab API object
+        store: `CourseStore` caching the course layout
+        course_name: name of the course
+        delete: delete the course instead of archiving its projects
+    """
+
+    layout = course_layout(gl, course_name, store)
+
+    if delete:
+        tasks = [Task(course_name, [Action(
+            'Delete group %s' % course_name,
+            lambda: gl.groups.delete(layout.course.id))], None)]
+    elif layout.reference is not None:
+        tasks = []
+        for fork in reference_forks(layout.reference, store):
+            tasks.append(Task(fork.username, [Action(
+                'Archive project %s' % fork.path,
+                lambda fork=fork: gl.projects.get(fork.id, lazy=True).archive())],
+                None))
+
+        tasks.append(Task(course_name, [Action(
+            'Archive reference project of %s' % course_name,
+            lambda: layout.reference.archive())], None))
+    else:
+        return []
+
+    # the course is only dropped from the store after all of its tasks succeeded
+    lock = threading.Lock()
+    remaining = [len(tasks)]
+
+    def done():
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                store.forget(course_name)
+
+    return [task._replace(done=done) for task in tasks]
+
+
+def print_plan(tasks):
+    """Prints the actions of the plan
+
+    Args:
+        tasks: planned tasks
+    """
+
+    for task in tasks:
+        for action in task.actions:
+            print(action.description)
+
+    print('%d operations planned' % sum(len(task.actions) for task in tasks))
+
+
+def execute_plan(tasks, jobs):
+    """Executes the tasks of the plan concurrently
+
+    Returns the tasks that failed.
+
+    Args:
+        tasks: planned tasks
+        jobs: maximum number of concurrent tasks
+    """
+
+    def execute(task):
+        for action in task.actions:
+            log.info(action.description)
+            action.run()
+        if task.done is not None:
+            task.done()
+
+    return run_parallel(execute, tasks, jobs, name=lambda task: task.name)
@@ -0,0 +1,123 @@
+import pytest
+
+from types import SimpleNamespace
+
+from gitlab.exceptions import GitlabGetError
+
+
+class FakeGitlab():
+    """Serves the course `course` (group 1) with its `students` (group 2)
+    and `solutions` (group 3) subgroups and the reference project (5)
+
+    Tests vary the course by changing the attributes:
+
+        accounts: username and tutorial group of each user by id, the group
+                  is `None` if the user has no tutorial group
+        members: ids of the users enrolled in the course
+        forked: ids of the users that have forked the reference project
+        shas: commit the tag points to in each fork
+        failing: calls that raise an error instead of being recorded
+
+    The subgroup of each user in `solutions` has the id of the user plus 20,
+    the fork of the user has the id of the user plus 10.
+    """
+
+    def __init__(self):
+        self.accounts = {10: ('alice', '1'), 11: ('bob', '2'), 12: ('carol', '1')}
+        self.members = [10, 11, 12]
+        self.forked = [10, 11, 12]
+        self.shas = {20: 'a1', 21: 'b1', 22: 'c1'}
+        self.failing = set()
+
+        self.calls = []
+        self.downloads = []
+        self.users_fetched = []
+
+        self.course = SimpleNamespace(
+            id=1, name='course',
+            subgroups=SimpleNamespace(list=self.course_subgroups))
+        self.students = SimpleNamespace(
+            id=2, name='students',
+            members=SimpleNamespace(list=self.list_members, delete=self.member_delete(2)))
+        self.solutions = SimpleNamespace(
+            id=3, name='solutions',
+            subgroups=SimpleNamespace(list=self.solution_subgroups))
+        self.reference = SimpleNamespace(
+            id=5, namespace={'full_path': 'course/solutions'},
+            archive=lambda: self.call('archive', 5),
+            forks=SimpleNamespace(list=self.list_forks))
+
+        self.groups = SimpleNamespace(
+            get=self.get_group, delete=lambda group_id: self.call('delete', group_id))
+        self.users = SimpleNamespace(get=self.get_user)
+        self.projects = SimpleNamespace(get=self.get_project)
+
+    def call(self, *call):
+        if call in self.failing:
+            raise RuntimeError()
+        self.calls.append(call)
+
+    def member_delete(self, group_id):
+        return lambda user_id: self.call('remove member', group_id, user_id)
+
+    def course_subgroups(self, search=None, all=False):
+        return [g for g in (self.students, self.solutions) if search in (None, g.name)]
+
+    def solution_subgroups(self, search=None, all=False):
+        return [SimpleNamespace(name=self.accounts[user_id][0], id=user_id + 20)
+                for user_id in self.forked]
+
+    def list_members(self, all=False):
+        return [SimpleNamespace(id=user_id) for user_id in self.members]
+
+    def list_forks(self, all=False):
+        return [self.fork(user_id) for user_id in self.forked]
+
+    def fork(self, user_id):
+        username = self.accounts[user_id][0]
+        return SimpleNamespace(
+            id=user_id + 10, namespace={'path': username},
+            path_with_namespace='course/solutions/%s/solutions' % username)
+
+    def get_user(self, user_id):
+        self.users_fetched.append(user_id)
+        username, group = self.accounts[user_id]
+
+        def get(key):
+            if group is None:
+                raise GitlabGetError()
+            return SimpleNamespace(value=group)
+
+        return SimpleNamespace(id=user_id, username=username,
+                               customattributes=SimpleNamespace(get=get))
+
+    def get_group(self, group_id, lazy=False):
+        if group_id in (1, 'course'):
+            return self.course
+        if group_id == 2:
+            return self.students
+        if group_id == 3:
+            return self.solutions
+        return SimpleNamespace(id=group_id, members=SimpleNamespace(
+            delete=self.member_delete(group_id)))
+
+    def get_project(self, project_id, lazy=False):
+        if project_id == 5:
+            return self.reference
+
+        def archive(sha, streamed, action):
+            self.downloads.append(project_id)
+            action(sha.encode())
+
+        tag = SimpleNamespace(commit={'id': self.shas.get(project_id)})
+        return SimpleNamespace(
+            tags=SimpleNamespace(get=lambda name: tag),
+            repository_archive=archive,
+            archive=lambda: self.call('archive', project_id))
+
+
+@pytest.fixture
+def gl():
+    """A fresh `FakeGitlab` for each test"""
+
+    return FakeGitlab()
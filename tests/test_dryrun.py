@@ -0,0 +1,106 @@
+from abgabesystem.dryrun import DryRun
+from abgabesystem.parallel import limit_requests, run_parallel
+
+
+class Gitlab():
+
+    def __init__(self):
+        self.sent = []
+
+    def http_request(self, verb, path, **kwargs):
+        self.sent.append((verb, path))
+
+
+def test_dry_run():
+    gl = Gitlab()
+    dry_run = DryRun()
+    dry_run.wrap(gl)
+
+    group = gl.http_request('post', '/groups', post_data={'name': 'course'}).json()
+    gl.http_request('get', '/groups/%d/projects' % group['id'])
+    gl.http_request('get', '/projects/course%2Fsolutions%2Fsolutions/forks')
+    gl.http_request('post', '/projects/42/repository/tags')
+
+    assert group['name'] == 'course'
+    assert gl.sent == [('get', '/projects/course%2Fsolutions%2Fsolutions/forks')]
+    assert dry_run.calls == {
+        'POST /groups': 1,
+        'GET /groups/:id/projects': 1,
+        'GET /projects/:id/forks': 1,
+        'POST /projects/:id/repository/tags': 1,
+    }
+    assert sum(dry_run.simulated.values()) == 3
+
+
+def test_endpoint_named_objects():
+    dry_run = DryRun()
+
+    assert dry_run.endpoint('get', '/groups/course') == 'GET /groups/:id'
+    assert dry_run.endpoint('get', 'https://gitlab/api/v4/groups/course/subgroups?search=students') \
+        == 'GET /groups/:id/subgroups'
+    assert dry_run.endpoint('get', '/projects/1/repository/tags/t1') \
+        == 'GET /projects/:id/repository/tags/:id'
+    assert dry_run.endpoint('get', '/users/10/custom_attributes/group') \
+        == 'GET /users/:id/custom_attributes/group'
+    assert dry_run.endpoint('delete', '/groups/2/members/10') == 'DELETE /groups/:id/members/:id'
+
+
+def tag_forks(gl, count):
+    for fork_id in range(count):
+        gl.http_request('post', '/projects/%d/repository/tags' % fork_id)
+
+
+def dry_run_latency(dry_run, latency):
+    dry_run.sent = 1
+    dry_run.duration = latency
+
+
+def test_estimate_serial():
+    gl = Gitlab()
+    dry_run = DryRun()
+    dry_run.wrap(gl)
+    dry_run_latency(dry_run, 0.5)
+    tag_forks(gl, 100)
+
+    assert dry_run.estimate(4, 0) == 50.0
+    assert dry_run.estimate(4, 1) == 100.0
+
+
+def test_estimate_one_course():
+    gl = Gitlab()
+    dry_run = DryRun()
+    dry_run.wrap(gl)
+    dry_run_latency(dry_run, 0.5)
+
+    run_parallel(lambda course: tag_forks(gl, 100), ['course'], 8)
+
+    # the requests of a single course are sent one after another
+    assert dry_run.estimate(8, 0) == 50.0
+
+
+def test_estimate_courses():
+    gl = Gitlab()
+    dry_run = DryRun()
+    dry_run.wrap(gl)
+    dry_run_latency(dry_run, 0.5)
+
+    run_parallel(lambda count: tag_forks(gl, count), [40, 20, 20, 20], 2)
+
+    assert dry_run.estimate(2, 0) == 25.0
+    assert dry_run.estimate(8, 0) == 20.0
+    assert dry_run.estimate(8, 2) == 50.0
+
+
+def test_latency_excludes_rate_limit():
+    gl = Gitlab()
+    limit = limit_requests(gl, 20)
+    dry_run = DryRun(limit)
+    dry_run.wrap(gl)
+
+    for _ in range(5):
+        gl.http_request('get', '/projects/1')
+
+    # the requests were delayed by 0.2 s in total, but sent instantly
+    assert dry_run.sent == 5
+    assert dry_run.latency() < 0.01
+    assert dry_run.estimate(1, 20) == 5 / 20
@@ -0,0 +1,88 @@
+import io
+import tarfile
+
+from abgabesystem.export import ArchiveWriter, export_submissions
+from abgabesystem.store import CourseStore
+
+
+def export(gl, store, output, per_group=False):
+    writer = ArchiveWriter(output, per_group)
+    try:
+        assert export_submissions(gl=gl, store=store, reference=gl.reference,
+                                  tag='tag', writer=writer, jobs=2) == []
+    finally:
+        writer.close()
+
+
+def contents(path):
+    with tarfile.open(path) as archive:
+        return dict((m.name, archive.extractfile(m).read()) for m in archive)
+
+
+def test_archive_writer(tmpdir):
+    output = str(tmpdir.join('export.tar'))
+    for username in ['alice', 'bob']:
+        writer = ArchiveWriter(output)
+        name = writer.member('tag', 'course', '1', username)
+        writer.add('1', name, io.BytesIO(b'data'), 4)
+        writer.close()
+
+    with tarfile.open(output) as archive:
+        assert sorted(archive.getnames()) == ['tag/course/1/alice.tar.gz', 'tag/course/1/bob.tar.gz']
+
+
+def test_archive_writer_per_group(tmpdir):
+    output = str(tmpdir.join('export'))
+    writer = ArchiveWriter(output, per_group=True)
+    writer.add('1', writer.member('tag', 'course', '1', 'alice'), io.BytesIO(b'data'), 4)
+    writer.add('2', writer.member('tag', 'course', '2', 'bob'), io.BytesIO(b'data'), 4)
+    writer.close()
+
+    assert sorted(tmpdir.join('export').listdir()) == [tmpdir.join('export', '1.tar'), tmpdir.join('export', '2.tar')]
+
+
+def test_export_groups_fresh_store(gl, tmpdir):
+    export(gl, CourseStore(), str(tmpdir.join('export')), per_group=True)
+
+    assert contents(str(tmpdir.join('export', '1.tar'))) == {
+        'tag/course/alice.tar.gz': b'a1',
+        'tag/course/carol.tar.gz': b'c1',
+    }
+    assert contents(str(tmpdir.join('export', '2.tar'))) == {'tag/course/bob.tar.gz': b'b1'}
+
+
+def test_export_unchanged_sha_is_skipped(gl, tmpdir):
+    store = CourseStore()
+    output = str(tmpdir.join('export.tar'))
+    export(gl, store, output)
+    gl.downloads = []
+
+    export(gl, store, output)
+
+    assert gl.downloads == []
+    assert contents(output) == {
+        'tag/course/1/alice.tar.gz': b'a1',
+        'tag/course/1/carol.tar.gz': b'c1',
+        'tag/course/2/bob.tar.gz': b'b1',
+    }
+
+
+def test_export_changed_sha(gl, tmpdir):
+    store = CourseStore()
+    output = str(tmpdir.join('export.tar'))
+    export(gl, store, output)
+    gl.downloads = []
+    gl.shas[20] = 'a2'
+
+    export(gl, store, output)
+
+    assert gl.downloads == [20]
+    with tarfile.open(output) as archive:
+        assert sorted(archive.getnames()) == [
+            'tag/course/1/alice.tar.gz', 'tag/course/1/carol.tar.gz', 'tag/course/2/bob.tar.gz']
+    assert contents(output) == {
+        'tag/course/1/alice.tar.gz': b'a2',
+        'tag/course/1/carol.tar.gz': b'c1',
+        'tag/course/2/bob.tar.gz': b'b1',
+    }
+    assert not tmpdir.join('export.tar.partial').exists()
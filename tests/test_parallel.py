@@ -0,0 +1,72 @@
+import io
+import time
+import threading
+
+from abgabesystem.parallel import RateLimit, WorkItem, read_manifest, run_in_stages, run_parallel
+
+
+def test_read_manifest():
+    manifest = io.StringIO('# course;students\nalgo;algo.csv\n\nprog 1\n')
+
+    assert list(read_manifest(manifest)) == [['algo', 'algo.csv'], ['prog 1']]
+
+
+def test_run_parallel():
+    done = []
+
+    def func(item):
+        if item == 2:
+            raise ValueError()
+        done.append(item)
+
+    assert run_parallel(func, [1, 2, 3], 2) == [2]
+    assert sorted(done) == [1, 3]
+
+
+def test_run_in_stages():
+    running = []
+    overlapped = threading.Event()
+    lock = threading.Lock()
+
+    def student(name):
+        with lock:
+            running.append(name)
+            if len(running) > 1:
+                overlapped.set()
+        # both students of the same course run at the same time
+        assert overlapped.wait(1)
+
+    def plan(course):
+        if course == 'missing':
+            raise ValueError()
+        return [WorkItem('%s/%s' % (course, name), lambda name=name: student(name))
+                for name in ('alice', 'bob')]
+
+    assert run_in_stages(plan, ['algo', 'missing'], 2) == ['missing']
+    assert sorted(running) == ['alice', 'bob']
+
+
+def test_rate_limit():
+    limit = RateLimit(20)
+
+    def wait():
+        for _ in range(3):
+            limit.wait()
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=wait) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 6 requests at 20 requests per second, the first one is not delayed
+    assert time.monotonic() - start >= 5 / 20 - 0.01
+
+
+def test_run_parallel_reports_failures(capsys):
+    def func(row):
+        raise ValueError('missing')
+
+    assert run_parallel(func, [['algo']], 1, name=lambda row: row[0]) == [['algo']]
+    assert 'Failed for algo: missing' in capsys.readouterr().err
@@ -0,0 +1,16 @@
+from abgabesystem.projects import reference_forks
+from abgabesystem.store import CourseStore
+
+
+def test_reference_forks_lists_new_forks(gl):
+    gl.forked = [10]
+    store = CourseStore()
+
+    assert [f.username for f in reference_forks(gl.reference, store)] == ['alice']
+
+    # bob was enrolled after the first deadline, alice's fork was deleted
+    gl.forked = [11]
+
+    assert [f.username for f in reference_forks(gl.reference, store)] == ['bob']
+    assert store.fork(21).path == 'course/solutions/bob/solutions'
+    assert store.fork(20) is None
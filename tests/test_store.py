@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from abgabesystem.store import CourseStore, refresh_reference
+
+
+def test_course():
+    store = CourseStore()
+    store.set_course('course', 1, students_id=2)
+    store.set_course('course', 1, solutions_id=3, reference_id=4)
+
+    course = store.course('course')
+    assert course.students_id == 2
+    assert course.solutions_id == 3
+    assert store.course_by_reference(4) == course
+    assert store.course('other') is None
+
+
+def test_users():
+    store = CourseStore()
+    store.add_user('course', 10, 'alice', '1')
+    store.add_user('course', 11, 'bob', '2')
+    store.add_user('other', 12, 'carol', '1')
+
+    assert store.user('course', 'alice').id == 10
+    assert [u.username for u in store.users('course')] == ['alice', 'bob']
+    assert [u.username for u in store.users('course', group='2')] == ['bob']
+
+
+def test_forget():
+    store = CourseStore()
+    store.set_course('course', 1, reference_id=4)
+    store.add_user('course', 10, 'alice', '1')
+    store.add_fork(20, 4, 'alice', 'course/solutions/alice/solutions')
+    store.add_fork(21, 5, 'bob', 'other/solutions/bob/solutions')
+
+    store.forget('course')
+
+    assert store.course('course') is None
+    assert store.users('course') == []
+    assert store.forks(4) == []
+    assert store.fork(21).username == 'bob'
+
+
+def test_refresh_reference():
+    store = CourseStore()
+    store.set_course('course', 1, reference_id=4)
+    store.add_fork(20, 4, 'alice')
+
+    refresh_reference(SimpleNamespace(refresh=False), store, 4)
+    assert store.course('course') is not None
+
+    refresh_reference(SimpleNamespace(refresh=True), store, 4)
+    assert store.course('course') is None
+    assert store.forks(4) == []
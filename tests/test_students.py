@@ -0,0 +1,61 @@
+from abgabesystem.store import CourseStore
+from abgabesystem.students import enrolled_students
+
+
+def test_enrolled_students_partial_store(gl):
+    store = CourseStore()
+    store.set_course('course', 1)
+    # e.g. written by `users` for a student created in that run
+    store.add_user('course', 10, 'alice', '1')
+
+    usernames = [u.username for u in enrolled_students(gl, gl.course, store)]
+
+    assert usernames == ['alice', 'bob', 'carol']
+    assert gl.users_fetched == [10, 11, 12]
+    assert store.students_listed('course')
+
+
+def test_enrolled_students_interrupted(gl):
+    store = CourseStore()
+
+    students = enrolled_students(gl, gl.course, store)
+    next(students)
+    students.close()
+
+    assert not store.students_listed('course')
+    assert [u.username for u in enrolled_students(gl, gl.course, store)] == ['alice', 'bob', 'carol']
+
+
+def test_enrolled_students_cached(gl):
+    store = CourseStore()
+    list(enrolled_students(gl, gl.course, store))
+    gl.users_fetched = []
+
+    assert [u.username for u in enrolled_students(gl, gl.course, store)] == ['alice', 'bob', 'carol']
+    assert gl.users_fetched == []
+
+    store.forget('course')
+    assert not store.students_listed('course')
+
+
+def test_enrolled_students_drops_former_members(gl):
+    # carol left the course since the students were stored
+    gl.members = [10, 11]
+    store = CourseStore()
+    store.set_course('course', 1)
+    store.add_user('course', 12, 'carol', '1')
+
+    list(enrolled_students(gl, gl.course, store))
+
+    assert [u.username for u in store.users('course')] == ['alice', 'bob']
+    assert store.user('course', 'carol') is None
+
+
+def test_enrolled_students_without_group(gl):
+    gl.accounts[11] = ('bob', None)
+    store = CourseStore()
+
+    list(enrolled_students(gl, gl.course, store))
+
+    assert store.user('course', 'bob').group is None
+    assert store.user('course', 'alice').group == '1'
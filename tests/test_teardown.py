@@ -0,0 +1,101 @@
+import pytest
+
+from abgabesystem.store import CourseStore
+from abgabesystem.teardown import RosterMismatch, archive_plan, execute_plan, unenroll_plan
+
+
+def course_store(gl):
+    store = CourseStore()
+    store.set_course('course', 1, students_id=2, solutions_id=3, reference_id=5)
+    store.set_users('course', [(user_id, username, group)
+                               for user_id, (username, group) in gl.accounts.items()])
+    store.set_students_listed('course')
+
+    return store
+
+
+def descriptions(tasks):
+    return [action.description for task in tasks for action in task.actions]
+
+
+def test_unenroll_roster_diff(gl):
+    tasks = unenroll_plan(gl, course_store(gl), 'course', {'alice', 'bob'})
+
+    assert [task.name for task in tasks] == ['carol']
+    assert descriptions(tasks) == [
+        'Archive project course/solutions/carol/solutions',
+        'Remove carol from group solutions/carol',
+        'Remove carol from group students',
+    ]
+
+
+def test_unenroll_delete(gl):
+    tasks = unenroll_plan(gl, course_store(gl), 'course', {'alice', 'bob'}, delete=True)
+
+    assert descriptions(tasks) == [
+        'Delete group solutions/carol',
+        'Remove carol from group students',
+    ]
+
+
+def test_unenroll_execute(gl):
+    store = course_store(gl)
+
+    tasks = unenroll_plan(gl, store, 'course', {'alice', 'bob'})
+    assert execute_plan(tasks, 2) == []
+
+    assert gl.calls == [('archive', 22), ('remove member', 32, 12), ('remove member', 2, 12)]
+    assert [user.username for user in store.users('course')] == ['alice', 'bob']
+    assert store.fork(22) is None
+
+
+def test_unenroll_failed_task(gl):
+    gl.failing.add(('archive', 22))
+    store = course_store(gl)
+
+    tasks = unenroll_plan(gl, store, 'course', {'alice'})
+    failed = execute_plan(tasks, 2)
+
+    assert [task.name for task in failed] == ['carol']
+    assert [user.username for user in store.users('course')] == ['alice', 'carol']
+
+
+def test_unenroll_everyone(gl):
+    with pytest.raises(RosterMismatch):
+        unenroll_plan(gl, course_store(gl), 'course', set())
+
+    tasks = unenroll_plan(gl, course_store(gl), 'course', set(), force=True)
+    assert [task.name for task in tasks] == ['alice', 'bob', 'carol']
+
+
+def test_archive_course(gl):
+    store = course_store(gl)
+
+    tasks = archive_plan(gl, store, 'course')
+    assert len(descriptions(tasks)) == 4
+    assert execute_plan(tasks, 2) == []
+
+    assert sorted(gl.calls) == [('archive', 5), ('archive', 20), ('archive', 21), ('archive', 22)]
+    assert store.course('course') is None
+
+
+def test_archive_course_failed_fork(gl):
+    gl.failing.add(('archive', 21))
+    store = course_store(gl)
+
+    failed = execute_plan(archive_plan(gl, store, 'course'), 2)
+
+    assert [task.name for task in failed] == ['bob']
+    assert store.course('course') is not None
+    assert store.fork(21) is not None
+
+
+def test_archive_course_delete(gl):
+    store = course_store(gl)
+
+    tasks = archive_plan(gl, store, 'course', delete=True)
+    assert descriptions(tasks) == ['Delete group course']
+    assert execute_plan(tasks, 2) == []
+
+    assert gl.calls == [('delete', 1)]
+    assert store.course('course') is None